@@ -77,6 +77,9 @@ def initialize_app():
 # 執行預載入
 tokenizer, model = initialize_app()
 
+# 模型資訊只取一次，側邊欄與頁尾共用
+model_info = get_model_info()
+
 # 標題
 st.markdown('<div class="main-header">🤖 AI 文本檢測器</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">檢測文字內容是否由 AI 生成</div>', unsafe_allow_html=True)
@@ -94,7 +97,6 @@ with st.sidebar:
     # 顯示模型資訊
     st.markdown("---")
     st.subheader("🤖 使用的模型")
-    model_info = get_model_info()
 
     with st.expander("查看模型詳情", expanded=False):
         st.markdown(f"""
@@ -108,6 +110,8 @@ with st.sidebar:
 
         **準確度：** {model_info['accuracy']}
 
+        **運行裝置：** `{model_info.get('device', 'cpu')}`
+
         **說明：** {model_info['description']}
 
         **完整路徑：** `{model_info['full_name']}`
@@ -177,7 +181,9 @@ with col1:
         )
         if uploaded_file is not None:
             try:
-                text_input = uploaded_file.read().decode('utf-8')
+                # 只讀取前 2 MB：2000 詞的上限遠低於此，避免超大檔案整份解碼
+                raw = uploaded_file.read(2_000_000)
+                text_input = raw.decode('utf-8', errors='ignore')
                 st.success(f"成功讀取檔案！字數：{len(text_input.split())} 詞")
                 with st.expander("查看檔案內容"):
                     st.text(text_input[:500] + "..." if len(text_input) > 500 else text_input)
@@ -244,12 +250,15 @@ if st.button("🔍 開始檢測", type="primary", use_container_width=True):
                 status_text.text("步驟 1/3: 文本預處理...")
                 progress_bar.progress(20)
 
-                # 限制文本長度
+                # 限制文本長度（split 一次後重用，避免重複掃描）
                 words = text_input.split()
                 if len(words) > max_words:
-                    text_to_analyze = ' '.join(words[:max_words])
+                    analyzed_words = words[:max_words]
+                    text_to_analyze = ' '.join(analyzed_words)
                 else:
+                    analyzed_words = words
                     text_to_analyze = text_input
+                n_analyzed = len(analyzed_words)
 
                 # 步驟 2: AI 檢測
                 status_text.text("步驟 2/3: AI 檢測分析...")
@@ -277,7 +286,6 @@ if st.button("🔍 開始檢測", type="primary", use_container_width=True):
                 st.session_state.detection_count += 1
 
                 # 顯示結果
-                time.sleep(0.5)  # 短暫延遲以顯示完成狀態
                 progress_bar.empty()
                 status_text.empty()
 
@@ -333,8 +341,8 @@ if st.button("🔍 開始檢測", type="primary", use_container_width=True):
                     with col3:
                         st.markdown("### 性能指標")
                         st.metric("處理時間", f"{elapsed_time:.2f} 秒")
-                        st.metric("分析字數", len(text_to_analyze.split()))
-                        st.metric("速度", f"{len(text_to_analyze.split())/elapsed_time:.0f} 詞/秒")
+                        st.metric("分析字數", n_analyzed)
+                        st.metric("速度", f"{n_analyzed/elapsed_time:.0f} 詞/秒")
 
                     # 判定原因與評比指標
                     st.markdown("---")
@@ -497,7 +505,6 @@ if st.button("🔍 開始檢測", type="primary", use_container_width=True):
 
 # 頁尾
 st.markdown("---")
-model_info = get_model_info()
 st.markdown(f"""
 <div style='text-align: center; color: #666; padding: 2rem;'>
     <p>🎓 NCHU Cybersecurity - AI Text Detector</p>
@@ -3,12 +3,22 @@ AI 文本檢測模型載入工具
 使用 Streamlit 快取機制優化載入時間
 """
 
+import os
+import re
+from bisect import bisect_left
+from functools import lru_cache
+
 import streamlit as st
+import numpy as np
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 
 # 模型配置信息
-MODEL_NAME = "Hello-SimpleAI/chatgpt-detector-roberta"
+# 可透過環境變數 DETECTOR_MODEL 換成蒸餾後的學生模型
+# （例如以原模型 soft label 微調過的 distilroberta-base，約 2 倍吞吐量、一半記憶體）
+MODEL_NAME = os.environ.get(
+    "DETECTOR_MODEL", "Hello-SimpleAI/chatgpt-detector-roberta"
+)
 MODEL_INFO = {
     "name": "ChatGPT Detector RoBERTa",
     "full_name": MODEL_NAME,
@@ -16,13 +26,90 @@ MODEL_INFO = {
     "size": "約 500 MB",
     "training_data": "ChatGPT 生成文本 vs 人類撰寫文本",
     "accuracy": "85-90%",
-    "description": "基於 RoBERTa 的 AI 文本檢測模型，專門訓練用於識別 ChatGPT 生成的內容"
+    "description": "基於 RoBERTa 的 AI 文本檢測模型，專門訓練用於識別 ChatGPT 生成的內容",
+    "device": "cpu"  # 由 load_detector_model 依實際裝置更新
 }
 
 
+# ONNX 模型快取目錄與 Session（若 onnxruntime 可用）
+_ONNX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+_ONNX_SESSION = None
+
+# 推論裝置與是否啟用 BF16 autocast（由 load_detector_model 設定）
+_DEVICE = "cpu"
+_USE_AUTOCAST = False
+
+# ONNX 路徑下取代 PyTorch 模型回傳的佔位物件
+# 推論全走 _ONNX_SESSION，只需通過 `if tokenizer and model:` 的真值檢查
+_ONNX_MODEL_PLACEHOLDER = "onnx"
+
+
+def _softmax_np(logits):
+    """對 NumPy logits 做數值穩定的 softmax"""
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def _build_onnx_session(tokenizer, model):
+    """
+    將 FP32 模型匯出為 ONNX 並做 INT8 動態量化，建立 InferenceSession
+    onnxruntime 未安裝時返回 None（改用 PyTorch 路徑）
+
+    Args:
+        tokenizer: tokenizer 物件
+        model: FP32 的 PyTorch 模型
+
+    Returns:
+        onnxruntime.InferenceSession 或 None
+    """
+    try:
+        import onnxruntime
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+    except ImportError:
+        return None
+
+    try:
+        os.makedirs(_ONNX_DIR, exist_ok=True)
+        # 檔名綁定模型名稱：切換 DETECTOR_MODEL 時會強制重新匯出
+        # 而不是默默載入上一個模型的量化圖
+        slug = re.sub(r'[^A-Za-z0-9._-]', '_', MODEL_NAME)
+        fp32_path = os.path.join(_ONNX_DIR, f"detector-{slug}.onnx")
+        int8_path = os.path.join(_ONNX_DIR, f"detector-{slug}.int8.onnx")
+
+        # 只在第一次匯出，之後直接載入量化後的檔案
+        if not os.path.exists(int8_path):
+            dummy = tokenizer("hello world", return_tensors="pt")
+            torch.onnx.export(
+                model,
+                (dummy["input_ids"], dummy["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "seq"},
+                    "attention_mask": {0: "batch", 1: "seq"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=17,
+            )
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+        # 啟用圖優化的推論 Session（MLAS 融合 kernel）
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        return onnxruntime.InferenceSession(int8_path, options)
+
+    except Exception:
+        # 匯出或載入失敗時退回 PyTorch 路徑
+        return None
+
+
+@lru_cache(maxsize=1)
 def get_model_info():
     """
-    獲取模型資訊
+    獲取模型資訊（結果 memoize，每次 rerun 不重複取用）
 
     Returns:
         dict: 模型資訊字典
@@ -40,15 +127,95 @@ def load_detector_model():
         tuple: (tokenizer, model)
     """
     try:
+        # 純推論行程：全域關閉 autograd，並明確設定執行緒數
+        # （預設執行緒數常因超執行緒而過度訂閱，反而拖慢吞吐量）
+        torch.set_grad_enabled(False)
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // 2))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # 平行工作啟動後即不可再調整，忽略即可
+            pass
+
         # 使用較小的模型以提升速度
         # 可選模型：
         # 1. "roberta-base-openai-detector" - OpenAI 官方檢測器（較大）
         # 2. "Hello-SimpleAI/chatgpt-detector-roberta" - 較小且快速
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        # 強制使用 Rust 實作的 fast tokenizer（比 Python 版快約一個數量級）
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+        if not tokenizer.is_fast:
+            st.warning("⚠️ fast tokenizer 不可用，tokenize 速度會較慢")
         model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
 
-        # 設置為評估模式
+        # 設置為評估模式，並關閉所有參數的梯度追蹤
         model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+
+        global _ONNX_SESSION, _DEVICE, _USE_AUTOCAST
+        _ONNX_SESSION = None
+
+        quantized = False
+        ipex_applied = False
+        if torch.cuda.is_available():
+            # GPU 可用時直接上 GPU，並以 BF16 autocast 減半激活值頻寬
+            _DEVICE = "cuda"
+            _USE_AUTOCAST = True
+            model = model.to(_DEVICE)
+        elif torch.backends.mps.is_available():
+            # Apple Silicon：走 MPS 後端，維持 FP32 精度
+            _DEVICE = "mps"
+            model = model.to(_DEVICE)
+        else:
+            _DEVICE = "cpu"
+
+            # CPU 上優先嘗試 ONNX Runtime：匯出 + INT8 量化 + 圖優化
+            # 以融合的 CPU kernel 取代逐 op 的 PyTorch dispatch
+            _ONNX_SESSION = _build_onnx_session(tokenizer, model)
+
+            # session 建立後推論不再經過 PyTorch 模型，
+            # 釋放約 500 MB 的 FP32 權重，只留佔位物件給真值檢查
+            if _ONNX_SESSION is not None:
+                del model
+                model = _ONNX_MODEL_PLACEHOLDER
+
+            # 其次嘗試 IPEX：oneDNN 圖融合 + BF16 kernel
+            # （AVX-512 / AMX 的 Xeon、Core CPU 上延遲明顯更低）
+            if _ONNX_SESSION is None:
+                try:
+                    import intel_extension_for_pytorch as ipex
+                    model = ipex.optimize(model, dtype=torch.bfloat16, inplace=True)
+                    _USE_AUTOCAST = True
+                    ipex_applied = True
+                except Exception:
+                    pass
+
+            # 最後退回動態量化，將所有 Linear 層的權重轉為 INT8
+            # 可減少約 4 倍權重記憶體，並透過 INT8 矩陣運算加速 2-4 倍
+            if _ONNX_SESSION is None and not ipex_applied:
+                try:
+                    model = torch.quantization.quantize_dynamic(
+                        model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                    quantized = True
+                except Exception:
+                    # 量化失敗時退回 FP32 模型，改用 CPU BF16 autocast
+                    _USE_AUTOCAST = True
+
+        # 側邊欄顯示實際使用的推論裝置
+        MODEL_INFO["device"] = _DEVICE
+
+        # torch.compile：讓 TorchInductor 融合前向傳播的 kernel
+        # 首次呼叫需要編譯暖機，之後命中編譯快取
+        # （eager 動態量化模組不走 Inductor、IPEX 已自帶圖融合，兩者維持 eager；
+        # MPS 亦排除——Inductor 不支援該後端，延遲編譯會在首次前向傳播才失敗）
+        if (_DEVICE != "mps" and _ONNX_SESSION is None
+                and not quantized and not ipex_applied
+                and hasattr(torch, "compile")):
+            try:
+                model = torch.compile(model, mode="reduce-overhead", dynamic=True)
+            except Exception:
+                pass
 
         return tokenizer, model
 
@@ -58,17 +225,110 @@ def load_detector_model():
         return None, None
 
 
+@st.cache_data(max_entries=64)
+def _tokenize(_tokenizer, text):
+    """
+    Tokenize 文本並快取結果
+    相同文本在 Streamlit rerun 時直接重用 token 張量，不必重新 tokenize
+
+    Args:
+        _tokenizer: tokenizer 物件（_ 前綴表示不要 hash 此參數）
+        text: 要 tokenize 的文本
+
+    Returns:
+        dict: tokenizer 輸出（PyTorch 張量）
+    """
+    # RoBERTa 不使用 token_type_ids，跳過該張量的配置
+    return _tokenizer(
+        text,
+        return_tensors="pt",
+        truncation=True,
+        max_length=512,
+        padding=True,
+        return_attention_mask=True,
+        return_token_type_ids=False
+    )
+
+
+# 信心等級與判定文案查表（以 bisect 依勝出機率取列，取代逐層 if-elif）
+_CONF_EDGES = (0.65, 0.85)
+_CONF_LEVELS = ("低", "中", "高")
+
+_LEVEL_EDGES = (0.65, 0.8, 0.9)
+_AI_LEVELS = (
+    ("輕微的 AI 特徵，但不確定（50-65%）", "輕微 AI 傾向"),
+    ("文本具有一定 AI 特徵（65-80%）", "部分 AI 特徵"),
+    ("檢測到明顯的 AI 生成特徵（80-90%）", "明顯 AI 特徵"),
+    ("模型對 AI 生成內容有極高信心（>90%）", "強 AI 語言模式"),
+)
+_HUMAN_LEVELS = (
+    ("輕微的人類特徵，但不確定（50-65%）", "輕微人類傾向"),
+    ("文本具有一定人類寫作特徵（65-80%）", "部分人類特徵"),
+    ("檢測到明顯的人類寫作特徵（80-90%）", "明顯人類特徵"),
+    ("模型對人類撰寫有極高信心（>90%）", "強人類寫作風格"),
+)
+
+
+def _build_result(ai_prob):
+    """
+    根據 AI 生成機率組裝檢測結果字典
+    供 predict_ai_text 與 batch_predict 共用
+
+    Args:
+        ai_prob: AI 生成機率（softmax 二分類，人類機率 = 1 - ai_prob）
+
+    Returns:
+        dict: 檢測結果（含信心等級、判定原因與指標）
+    """
+    human_prob = 1.0 - ai_prob
+
+    # 判斷信心等級（查表）
+    max_prob = max(human_prob, ai_prob)
+    confidence = _CONF_LEVELS[bisect_left(_CONF_EDGES, max_prob)]
+
+    # 分析機率分佈（兩機率和為 1，差距即 |2p - 1|）
+    prob_diff = abs(2.0 * ai_prob - 1.0)
+
+    # 生成判定原因說明：依勝出機率查表取文案
+    if ai_prob > human_prob:
+        level_reason, indicator = _AI_LEVELS[bisect_left(_LEVEL_EDGES, ai_prob)]
+        gap_large = "AI 與人類機率差距大，判定較明確"
+        gap_small = "機率接近，可能是混合內容或邊界案例"
+    else:
+        level_reason, indicator = _HUMAN_LEVELS[bisect_left(_LEVEL_EDGES, human_prob)]
+        gap_large = "人類與 AI 機率差距大，判定較明確"
+        gap_small = "機率接近，可能是 AI 輔助寫作或高品質 AI 內容"
+
+    reasons = [level_reason]
+    indicators = [indicator]
+
+    if prob_diff > 0.5:
+        reasons.append(gap_large)
+    elif prob_diff < 0.2:
+        reasons.append(gap_small)
+
+    return {
+        'is_ai': ai_prob > human_prob,
+        'ai_probability': ai_prob,
+        'human_probability': human_prob,
+        'confidence': confidence,
+        'reasons': reasons,
+        'indicators': indicators,
+        'probability_difference': prob_diff
+    }
+
+
 @st.cache_data(show_spinner="正在分析文本...")
-def predict_ai_text(_tokenizer, _model, text, max_length=512):
+def predict_ai_text(_tokenizer, _model, text):
     """
     預測文本是否由 AI 生成
     使用 @st.cache_data 快取相同文本的結果
+    過長的文本由 tokenizer 以 512 token 截斷
 
     Args:
         _tokenizer: tokenizer 物件（_ 前綴表示不要 hash 此參數）
         _model: model 物件（_ 前綴表示不要 hash 此參數）
         text: 要檢測的文本
-        max_length: 最大文本長度（避免過長導致處理緩慢）
 
     Returns:
         dict: {
@@ -82,94 +342,41 @@ def predict_ai_text(_tokenizer, _model, text, max_length=512):
         return None
 
     try:
-        # 文本預處理：限制長度以提升速度
-        if len(text.split()) > max_length:
-            # 只取前 max_length 個詞
-            text = ' '.join(text.split()[:max_length])
-
-        # Tokenize 輸入
-        inputs = _tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding=True
-        )
-
-        # 預測（不計算梯度以節省記憶體和時間）
-        with torch.no_grad():
-            outputs = _model(**inputs)
-            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-
-        # 解析結果
-        human_prob = predictions[0][0].item()
-        ai_prob = predictions[0][1].item()
-
-        # 判斷信心等級
-        max_prob = max(human_prob, ai_prob)
-        if max_prob > 0.85:
-            confidence = "高"
-        elif max_prob > 0.65:
-            confidence = "中"
+        # Tokenize 輸入（結果以文本 hash 為鍵快取）
+        # truncation=True 已在 C 層級截斷到 512 token，毋須 Python 端預切
+        inputs = _tokenize(_tokenizer, text)
+
+        if _ONNX_SESSION is not None:
+            # ONNX Runtime 路徑：INT8 量化 + 融合 kernel
+            logits = _ONNX_SESSION.run(
+                None,
+                {
+                    "input_ids": inputs["input_ids"].numpy(),
+                    "attention_mask": inputs["attention_mask"].numpy(),
+                },
+            )[0]
+            predictions = _softmax_np(logits)
+            ai_prob = float(predictions[0][1])
         else:
-            confidence = "低"
-
-        # 生成判定原因說明
-        reasons = []
-        indicators = []
-
-        # 分析機率分佈
-        prob_diff = abs(ai_prob - human_prob)
-
-        if ai_prob > human_prob:
-            # AI 判定的原因
-            if ai_prob > 0.9:
-                reasons.append("模型對 AI 生成內容有極高信心（>90%）")
-                indicators.append("強 AI 語言模式")
-            elif ai_prob > 0.8:
-                reasons.append("檢測到明顯的 AI 生成特徵（80-90%）")
-                indicators.append("明顯 AI 特徵")
-            elif ai_prob > 0.65:
-                reasons.append("文本具有一定 AI 特徵（65-80%）")
-                indicators.append("部分 AI 特徵")
-            else:
-                reasons.append("輕微的 AI 特徵，但不確定（50-65%）")
-                indicators.append("輕微 AI 傾向")
-
-            if prob_diff > 0.5:
-                reasons.append("AI 與人類機率差距大，判定較明確")
-            elif prob_diff < 0.2:
-                reasons.append("機率接近，可能是混合內容或邊界案例")
-
-        else:
-            # 人類判定的原因
-            if human_prob > 0.9:
-                reasons.append("模型對人類撰寫有極高信心（>90%）")
-                indicators.append("強人類寫作風格")
-            elif human_prob > 0.8:
-                reasons.append("檢測到明顯的人類寫作特徵（80-90%）")
-                indicators.append("明顯人類特徵")
-            elif human_prob > 0.65:
-                reasons.append("文本具有一定人類寫作特徵（65-80%）")
-                indicators.append("部分人類特徵")
-            else:
-                reasons.append("輕微的人類特徵，但不確定（50-65%）")
-                indicators.append("輕微人類傾向")
-
-            if prob_diff > 0.5:
-                reasons.append("人類與 AI 機率差距大，判定較明確")
-            elif prob_diff < 0.2:
-                reasons.append("機率接近，可能是 AI 輔助寫作或高品質 AI 內容")
-
-        return {
-            'is_ai': ai_prob > human_prob,
-            'ai_probability': ai_prob,
-            'human_probability': human_prob,
-            'confidence': confidence,
-            'reasons': reasons,
-            'indicators': indicators,
-            'probability_difference': prob_diff
-        }
+            inputs = {k: v.to(_DEVICE) for k, v in inputs.items()}
+
+            # 預測（inference_mode 比 no_grad 更省：跳過 version counter）
+            with torch.inference_mode():
+                if _USE_AUTOCAST:
+                    # BF16 autocast：減半激活值頻寬、提升吞吐量
+                    with torch.autocast(device_type=_DEVICE, dtype=torch.bfloat16):
+                        outputs = _model(**inputs)
+                else:
+                    outputs = _model(**inputs)
+                # softmax 以 FP32 計算確保數值精度
+                predictions = torch.nn.functional.softmax(
+                    outputs.logits.float(), dim=-1
+                )
+
+            # 解析結果：只取一個值，省去一次 .item() 同步
+            ai_prob = predictions[0, 1].item()
+
+        return _build_result(ai_prob)
 
     except Exception as e:
         st.error(f"預測過程發生錯誤: {str(e)}")
@@ -210,11 +417,49 @@ def batch_predict(_tokenizer, _model, chunks):
     Returns:
         list: 每個片段的預測結果
     """
-    results = []
+    if not chunks or not _tokenizer or not _model:
+        return []
 
-    for chunk in chunks:
-        result = predict_ai_text(_tokenizer, _model, chunk)
-        if result:
-            results.append(result)
+    try:
+        # 一次 tokenize 所有片段，padding 對齊後做單次批次前向傳播
+        # 一個大 GEMM 取代 N 個小 GEMM，攤平 kernel 啟動與 Python 開銷
+        # padding=True 只補到批次內最長序列（再補到 16 的倍數以配合
+        # kernel 對齊），不是固定 512，attention 運算量隨之平方下降
+        enc = _tokenizer(
+            chunks,
+            return_tensors="pt",
+            truncation=True,
+            max_length=512,
+            padding=True,
+            pad_to_multiple_of=16,
+            return_attention_mask=True,
+            return_token_type_ids=False
+        )
 
-    return results
+        if _ONNX_SESSION is not None:
+            logits = _ONNX_SESSION.run(
+                None,
+                {
+                    "input_ids": enc["input_ids"].numpy(),
+                    "attention_mask": enc["attention_mask"].numpy(),
+                },
+            )[0]
+            probs = _softmax_np(logits)
+        else:
+            enc = {k: v.to(_DEVICE) for k, v in enc.items()}
+            with torch.inference_mode():
+                if _USE_AUTOCAST:
+                    with torch.autocast(device_type=_DEVICE, dtype=torch.bfloat16):
+                        outputs = _model(**enc)
+                else:
+                    outputs = _model(**enc)
+                probs = torch.nn.functional.softmax(
+                    outputs.logits.float(), dim=-1
+                ).cpu().numpy()
+
+        # 由 (N, 2) 機率矩陣組裝各片段的結果字典
+        return [_build_result(float(row[1])) for row in probs]
+
+    except Exception as e:
+        st.error(f"批次預測過程發生錯誤: {str(e)}")
+        return []
@@ -5,8 +5,42 @@
 
 import re
 from collections import Counter
+
+import numpy as np
 import streamlit as st
 
+# numba 為選用加速：未安裝時退回 NumPy 實作
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# 模組層級常量：避免每次呼叫重建集合或重新編譯 regex
+_TRANSITION = frozenset({
+    'however', 'moreover', 'furthermore', 'additionally',
+    'consequently', 'therefore', 'thus', 'hence'
+})
+_SENT_RE = re.compile(r'[.!?]+')
+_PUNC_RE = re.compile(r'[,.!?;:]')
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _std_jit(values):
+        """以 Welford 單趟演算法計算母體標準差（JIT 編譯）"""
+        n = values.size
+        mean = 0.0
+        m2 = 0.0
+        for i in range(n):
+            delta = values[i] - mean
+            mean += delta / (i + 1)
+            m2 += delta * (values[i] - mean)
+        return (m2 / n) ** 0.5
+else:
+    def _std_jit(values):
+        """numba 不可用時的 NumPy 後備實作"""
+        return float(values.std())
+
 
 @st.cache_data
 def analyze_text_features(text):
@@ -21,7 +55,7 @@ def analyze_text_features(text):
     """
     # 基本統計
     words = text.split()
-    sentences = re.split(r'[.!?]+', text)
+    sentences = _SENT_RE.split(text)
     sentences = [s.strip() for s in sentences if s.strip()]
 
     # 字數和句數
@@ -31,33 +65,39 @@ def analyze_text_features(text):
     # 平均句長
     avg_sentence_length = word_count / sentence_count if sentence_count > 0 else 0
 
-    # 平均詞長
-    avg_word_length = sum(len(word) for word in words) / word_count if word_count > 0 else 0
+    # 平均詞長：單次掃描建成 NumPy 陣列，以 C 層級歸約取代 Python 迴圈
+    word_lengths = np.fromiter(
+        (len(word) for word in words), dtype=np.int32, count=word_count
+    )
+    avg_word_length = float(word_lengths.mean()) if word_count > 0 else 0
+
+    # 單次 hash 掃描同時取得詞頻與唯一詞數
+    word_counts = Counter(words)
 
     # 詞彙多樣性（Type-Token Ratio）
-    unique_words = len(set(words))
+    unique_words = len(word_counts)
     ttr = unique_words / word_count if word_count > 0 else 0
 
     # 標點符號統計
-    punctuation = re.findall(r'[,.!?;:]', text)
+    punctuation = _PUNC_RE.findall(text)
     punctuation_count = len(punctuation)
     punctuation_ratio = punctuation_count / len(text) if len(text) > 0 else 0
 
     # 常見 AI 指標
-    # 1. 過度使用的轉折詞
-    transition_words = [
-        'however', 'moreover', 'furthermore', 'additionally',
-        'consequently', 'therefore', 'thus', 'hence'
-    ]
-    transition_count = sum(1 for word in words if word.lower() in transition_words)
+    # 1. 過度使用的轉折詞（只需走訪唯一詞，不再逐詞比對）
+    transition_count = sum(
+        count for word, count in word_counts.items()
+        if word.lower() in _TRANSITION
+    )
     transition_ratio = transition_count / word_count if word_count > 0 else 0
 
     # 2. 句子長度變異性（人類寫作通常句長變化較大）
-    sentence_lengths = [len(s.split()) for s in sentences]
-    if len(sentence_lengths) > 1:
-        avg_len = sum(sentence_lengths) / len(sentence_lengths)
-        variance = sum((x - avg_len) ** 2 for x in sentence_lengths) / len(sentence_lengths)
-        sentence_variance = variance ** 0.5
+    # s.count(' ') + 1 估算詞數，免去為每句建一個 list
+    sentence_lengths = np.fromiter(
+        (s.count(' ') + 1 for s in sentences), dtype=np.float64, count=sentence_count
+    )
+    if sentence_count > 1:
+        sentence_variance = float(_std_jit(sentence_lengths))
     else:
         sentence_variance = 0
 